@@ -201,7 +201,7 @@ def Gram_matrix_assembly(
             jnp.reshape(val, (N_domain, N_domain + N_boundary))
         )
         Theta = Theta.at[3 * N_domain :, N_domain : 2 * N_domain].set(
-            jnp.transpose(onp.reshape(val, (N_domain, N_domain + N_boundary)))
+            jnp.transpose(jnp.reshape(val, (N_domain, N_domain + N_boundary)))
         )
 
         val = vmap(
@@ -1,10 +1,14 @@
 # JAX
+from collections import namedtuple
 from functools import partial
 
 import jax.numpy as jnp
 import jax.ops as jop
-from jax import grad, hessian, jit, vmap
+import jax.random as jrandom
+from jax import grad, hessian, jacfwd, jit, lax, vmap
 from jax.config import config
+from jax.scipy.linalg import cho_factor, cho_solve, solve_triangular
+from jax.scipy.sparse.linalg import cg
 
 config.update("jax_enable_x64", True)
 
@@ -12,12 +16,71 @@ import sys
 
 # numpy
 import numpy as onp
-from numpy import random
 
 from .Gram_matrice import Gram_matrix_assembly, construct_Theta_test
 from .sample_points import sampled_pts_grid, sampled_pts_rdm
 
 
+# solve (L L^T) x = b with L factored in reduced precision, recovering double
+# accuracy with a few iterative-refinement sweeps against the full-precision A
+def solve_refine(L, A, b, refine_steps=2):
+    x = solve_triangular(
+        L, solve_triangular(L, b.astype(L.dtype), lower=True), lower=True, trans="T"
+    ).astype(A.dtype)
+    for _ in range(refine_steps):
+        r = b - jnp.matmul(A, x)
+        dx = solve_triangular(
+            L,
+            solve_triangular(L, r.astype(L.dtype), lower=True),
+            lower=True,
+            trans="T",
+        )
+        x = x + dx.astype(A.dtype)
+    return x
+
+
+# adaptive nugget in one jitted call: the trace reductions, the per-block
+# diagonal weights and the diagonal update all fuse, and the nugget stays a
+# traced argument so sweeping it does not retrace. The diagonal is updated in
+# place via index add instead of materializing jnp.diag of the weights.
+@partial(jit, static_argnums=(1, 2, 3, 5))
+def _add_adaptive_nugget(Theta, N_domain, N_boundary, num_blocks, nugget, trace_start=None):
+    # leading num_blocks derivative blocks of size N_domain, trailing value +
+    # boundary block of size N_domain + N_boundary. The block traces are
+    # normalized by the trace of Theta[trace_start:, trace_start:], which
+    # defaults to the whole trailing block; callers whose original reduction
+    # used a different corner (src_new normalizes by the boundary corner
+    # alone) pass trace_start explicitly
+    if trace_start is None:
+        trace_start = num_blocks * N_domain
+    trace_last = jnp.trace(Theta[trace_start:, trace_start:])
+    ratios = [
+        jnp.trace(
+            Theta[i * N_domain : (i + 1) * N_domain, i * N_domain : (i + 1) * N_domain]
+        )
+        / trace_last
+        for i in range(num_blocks)
+    ]
+    weights = jnp.concatenate(
+        [r * jnp.ones(N_domain) for r in ratios] + [jnp.ones(N_domain + N_boundary)]
+    )
+    idx = jnp.arange((num_blocks + 1) * N_domain + N_boundary)
+    return Theta.at[idx, idx].add(nugget * weights), ratios
+
+
+# one factorization as an immutable snapshot. The Newton closures are jitted
+# with self static, so anything read off the instance is frozen into the
+# trace at first call; routing the factor-dependent arrays through a snapshot
+# passed as a traced argument instead makes a re-factorization (nugget sweep,
+# precision switch, re-sampling) ordinary new input data that the cached
+# traces pick up. namedtuples are pytrees, so jit traces their fields.
+_EllipticFactors = namedtuple(
+    "_EllipticFactors", ("L", "L_inv_rhs", "L_inv_bdy", "rhs_f")
+)
+_BurgersFactors = namedtuple("_BurgersFactors", ("L", "L_inv_const", "B"))
+_EikonalFactors = namedtuple("_EikonalFactors", ("L", "L_inv_const"))
+
+
 class Nonlinear_elliptic2d(object):
     def __init__(
         self, alpha=1.0, m=3, bdy=None, rhs=None, domain=onp.array([[0, 1], [0, 1]])
@@ -35,6 +98,14 @@ class Nonlinear_elliptic2d(object):
     def get_rhs(self, x1, x2):
         return self.rhs(x1, x2)
 
+    # row-wise variants, so vmap over sampled points reads whole rows instead
+    # of gathering the two coordinate columns separately
+    def get_bd_vec(self, x):
+        return self.bdy(x[0], x[1])
+
+    def get_rhs_vec(self, x):
+        return self.rhs(x[0], x[1])
+
     # sampling points according to random or grid rules
     def sampled_pts(self, N_domain, N_boundary, sampled_type="random"):
         # if rdm is true, sample points uniformly randomly, else in a uniform grid
@@ -50,8 +121,9 @@ class Nonlinear_elliptic2d(object):
         self.N_domain = X_domain.shape[0]
         self.X_boundary = X_boundary
         self.N_boundary = X_boundary.shape[0]
-        self.rhs_f = vmap(self.get_rhs)(X_domain[:, 0], X_domain[:, 1])
-        self.bdy_g = vmap(self.get_bd)(X_boundary[:, 0], X_boundary[:, 1])
+        self.rhs_f = vmap(self.get_rhs_vec)(X_domain)
+        self.bdy_g = vmap(self.get_bd_vec)(X_boundary)
+        self._Theta_raw = None  # points changed: invalidate the cached Gram matrix
 
     # directly given sampled points
     def get_sampled_points(self, X_domain, X_boundary):
@@ -59,8 +131,31 @@ class Nonlinear_elliptic2d(object):
         self.N_domain = X_domain.shape[0]
         self.X_boundary = X_boundary
         self.N_boundary = X_boundary.shape[0]
-        self.rhs_f = vmap(self.get_rhs)(X_domain[:, 0], X_domain[:, 1])
-        self.bdy_g = vmap(self.get_bd)(X_boundary[:, 0], X_boundary[:, 1])
+        self.rhs_f = vmap(self.get_rhs_vec)(X_domain)
+        self.bdy_g = vmap(self.get_bd_vec)(X_boundary)
+        self._Theta_raw = None  # points changed: invalidate the cached Gram matrix
+
+    # cache the raw (nugget-free) Gram matrix so sweeping nugget or
+    # nugget_type does not redo the dominant assembly work
+    def _assemble_raw(self, kernel, kernel_parameter):
+        if (
+            getattr(self, "_Theta_raw", None) is None
+            or self._Theta_raw_key != (kernel, kernel_parameter)
+        ):
+            # this assembly fills a host numpy buffer; convert once here so
+            # the diagonal updates in Gram_matrix can use .at[] on a device
+            # array
+            self._Theta_raw = jnp.asarray(
+                Gram_matrix_assembly(
+                    self.X_domain,
+                    self.X_boundary,
+                    eqn="Nonlinear_elliptic",
+                    kernel=kernel,
+                    kernel_parameter=kernel_parameter,
+                )
+            )
+            self._Theta_raw_key = (kernel, kernel_parameter)
+        return self._Theta_raw
 
     def Gram_matrix(
         self,
@@ -69,142 +164,286 @@ class Nonlinear_elliptic2d(object):
         nugget=1e-8,
         nugget_type="adaptive",
     ):
-        Theta = Gram_matrix_assembly(
-            self.X_domain,
-            self.X_boundary,
-            eqn="Nonlinear_elliptic",
-            kernel=kernel,
-            kernel_parameter=kernel_parameter,
-        )
+        Theta = self._assemble_raw(kernel, kernel_parameter)
         self.nugget_type = nugget_type
         self.nugget = nugget
         self.kernel = kernel
         self.kernel_parameter = kernel_parameter
         if nugget_type == "adaptive":
-            # calculate trace
-            trace1 = jnp.trace(Theta[: self.N_domain, : self.N_domain])
-            trace2 = jnp.trace(Theta[self.N_domain :, self.N_domain :])
-            ratio = trace1 / trace2
-            self.ratio = ratio
-            temp = jnp.concatenate(
-                (
-                    ratio * jnp.ones((1, self.N_domain)),
-                    jnp.ones((1, self.N_domain + self.N_boundary)),
-                ),
-                axis=1,
+            self.Theta, ratios = _add_adaptive_nugget(
+                Theta, self.N_domain, self.N_boundary, 1, nugget
             )
-            self.Theta = Theta + nugget * jnp.diag(temp[0])
+            self.ratio = ratios[0]
         elif nugget_type == "identity":
-            self.Theta = Theta + nugget * jnp.eye(2 * self.N_domain + self.N_boundary)
+            # add along the diagonal directly instead of forming nugget*I
+            idx = jnp.arange(2 * self.N_domain + self.N_boundary)
+            self.Theta = Theta.at[idx, idx].add(nugget)
         elif nugget_type == "none":
             self.Theta = Theta
 
-    def Gram_Cholesky(self):
-        try:
-            self.L = jnp.linalg.cholesky(self.Theta)
-        except:
+    def Gram_Cholesky(self, precision="double"):
+        # precision="single" factors in float32; extend_sol then recovers
+        # double accuracy through iterative refinement (solve_refine).
+        # Re-factorizing an already-factored object at another precision is
+        # fine: the snapshot below carries the new factor into the jitted
+        # closures
+        Theta = self.Theta
+        if precision == "single":
+            Theta = Theta.astype(jnp.float32)
+        # keep the packed factor for cho_solve; self.L aliases the lower
+        # triangle for the one-sided solves in the loss closures
+        self.L_factor = cho_factor(Theta, lower=True)
+        self.L = self.L_factor[0]
+        # jax reports a non-SPD matrix through NaNs in the factor rather than
+        # by raising, so check explicitly to fail before the Newton loop
+        if jnp.isnan(self.L).any():
             print("[Error] Cholesky factorization failed: maybe nugget is too small!")
             sys.exit()
+        # solve the z-independent residual blocks against L once, so the loss
+        # closures only re-solve the z-dependent part each iteration
+        self.L_inv_rhs = solve_triangular(
+            self.L,
+            jnp.concatenate((-self.rhs_f, jnp.zeros(self.N_domain + self.N_boundary))),
+            lower=True,
+        )
+        self.L_inv_bdy = solve_triangular(
+            self.L,
+            jnp.concatenate((jnp.zeros(2 * self.N_domain), self.bdy_g)),
+            lower=True,
+        )
+        # full solve of the boundary block, reused by every extend_sol call
+        self._w_bdy = cho_solve(
+            self.L_factor,
+            jnp.concatenate((jnp.zeros(2 * self.N_domain), self.bdy_g)),
+        )
+        # snapshot of this factorization for the jitted closures, which take
+        # it as a traced argument rather than reading mutable state off self
+        self.factors = _EllipticFactors(
+            self.L, self.L_inv_rhs, self.L_inv_bdy, self.rhs_f
+        )
 
     @partial(jit, static_argnums=(0,))
-    def loss(self, z):
-        zz = jnp.append(self.alpha * (z**self.m) - self.rhs_f, z)
-        zz = jnp.append(zz, self.bdy_g)
-        zz = jnp.linalg.solve(self.L, zz)
+    def _loss(self, fac, z):
+        zz = jnp.concatenate(
+            (self.alpha * (z**self.m), z, jnp.zeros(self.N_boundary))
+        )
+        zz = fac.L_inv_rhs + fac.L_inv_bdy + solve_triangular(fac.L, zz, lower=True)
         return jnp.dot(zz, zz)
 
+    def loss(self, z):
+        return self._loss(self.factors, z)
+
     @partial(jit, static_argnums=(0,))
+    def _grad_loss(self, fac, z):
+        return grad(self._loss, argnums=1)(fac, z)
+
     def grad_loss(self, z):
-        return grad(self.loss)(z)
+        return self._grad_loss(self.factors, z)
 
+    # z-dependent part of the linearized residual, shared by GN_loss and Hessian_GN
     @partial(jit, static_argnums=(0,))
-    def GN_loss(self, z, z_old):
-        zz = jnp.append(self.alpha * self.m * (z_old ** (self.m - 1)) * (z - z_old), z)
-        zz = jnp.append(zz, self.bdy_g)
-        zz = jnp.linalg.solve(self.L, zz)
+    def _residual_gn(self, z, z_old):
+        return jnp.concatenate(
+            (
+                self.alpha * self.m * (z_old ** (self.m - 1)) * (z - z_old),
+                z,
+                jnp.zeros(self.N_boundary),
+            )
+        )
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_loss(self, fac, z, z_old):
+        zz = fac.L_inv_bdy + solve_triangular(
+            fac.L, self._residual_gn(z, z_old), lower=True
+        )
         return jnp.dot(zz, zz)
 
+    def GN_loss(self, z, z_old):
+        return self._GN_loss(self.factors, z, z_old)
+
     @partial(jit, static_argnums=(0,))
+    def _Hessian_GN(self, fac, z, z_old):
+        # GN_loss is quadratic in z, so its Hessian is 2 J^T (L L^T)^{-1} J with
+        # J the residual Jacobian; jacfwd of the affine residual avoids
+        # differentiating through the triangular solve twice
+        dR = jacfwd(self._residual_gn)(z, z_old)
+        J = solve_triangular(fac.L, dR, lower=True)
+        return 2 * jnp.matmul(jnp.transpose(J), J)
+
     def Hessian_GN(self, z, z_old):
-        return hessian(self.GN_loss)(z, z_old)
+        return self._Hessian_GN(self.factors, z, z_old)
+
+    def _jacobian_gn(self, z_old, zpow=None):
+        # Jacobian of the stacked residual with respect to z; also the Jacobian
+        # of the linearized residual used by GN_loss
+        # scatter only the O(N) nonzero entries instead of materializing
+        # dense jnp.diag/jnp.eye blocks; zpow = z_old**(m-1) may be passed in
+        # to share the power evaluation with the residual
+        if zpow is None:
+            zpow = z_old ** (self.m - 1)
+        idx = jnp.arange(self.N_domain)
+        mtx = jnp.zeros((2 * self.N_domain + self.N_boundary, self.N_domain))
+        mtx = mtx.at[idx, idx].set(self.alpha * self.m * zpow)
+        mtx = mtx.at[self.N_domain + idx, idx].set(1.0)
+        return mtx
+
+    @partial(jit, static_argnums=(0,))
+    def _Hessian_GN_explicit(self, fac, z_old):
+        # closed-form Gauss-Newton Hessian 2 J^T (L L^T)^{-1} J, where J is the
+        # Jacobian of the linearized residual; avoids differentiating through
+        # the linear solve twice
+        ss = solve_triangular(fac.L, self._jacobian_gn(z_old), lower=True)
+        return 2 * jnp.matmul(jnp.transpose(ss), ss)
+
+    def Hessian_GN_explicit(self, z_old):
+        return self._Hessian_GN_explicit(self.factors, z_old)
+
+    def _gn_factors(self, fac, z):
+        # residual and Jacobian solved against L, shared by the step variants
+        zpow = z ** (self.m - 1)  # z**m = zpow * z, reused by the Jacobian
+        zz = jnp.concatenate((self.alpha * zpow * z, z, jnp.zeros(self.N_boundary)))
+        r = fac.L_inv_rhs + fac.L_inv_bdy + solve_triangular(fac.L, zz, lower=True)
+        Jt = solve_triangular(fac.L, self._jacobian_gn(z, zpow), lower=True)
+        return r, Jt
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_step(self, fac, z):
+        # fused Gauss-Newton step: the gradient 2 J^T L^{-T} r and the Hessian
+        # 2 J^T L^{-T} L^{-1} J share the same solved Jacobian L^{-1} J
+        r, Jt = self._gn_factors(fac, z)
+        return 2 * jnp.matmul(jnp.transpose(Jt), r), 2 * jnp.matmul(
+            jnp.transpose(Jt), Jt
+        )
+
+    def GN_step(self, z):
+        return self._GN_step(self.factors, z)
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_step_cg(self, fac, z):
+        # matrix-free variant: solve H d = grad by conjugate gradients on
+        # v -> 2 Jt^T (Jt v) without ever forming the Hessian
+        r, Jt = self._gn_factors(fac, z)
+        grad_now = 2 * jnp.matmul(jnp.transpose(Jt), r)
+        # Jacobi preconditioner: the Hessian diagonal is the squared column
+        # norms of Jt, and without it cg stalls within the iteration budget
+        # on the ill-conditioned systems small nuggets produce
+        diag_H = 2 * jnp.sum(Jt * Jt, axis=0)
+        step, _ = cg(
+            lambda v: 2 * jnp.matmul(jnp.transpose(Jt), jnp.matmul(Jt, v)),
+            grad_now,
+            tol=1e-8,
+            maxiter=50,
+            M=lambda v: v / diag_H,
+        )
+        return step
 
-    def GN_method(self, max_iter=3, step_size=1, initial_sol="rdm", print_hist=True):
+    def GN_step_cg(self, z):
+        return self._GN_step_cg(self.factors, z)
+
+    def GN_method(
+        self,
+        max_iter=3,
+        step_size=1,
+        initial_sol="rdm",
+        print_hist=True,
+        linear_solver="direct",
+        key=None,
+    ):
+        # draw the initial guess with jax.random so it is born on device and
+        # reproducible across backends
+        if key is None:
+            key = jrandom.PRNGKey(0)
         if initial_sol == "rdm":
-            sol = random.normal(0.0, 1.0, (self.N_domain))
+            sol = jrandom.normal(key, (self.N_domain,))
         self.init_sol = sol
-        loss_hist = []  # history of loss function values
-        loss_now = self.loss(sol)
-        loss_hist.append(loss_now)
-        if jnp.isnan(loss_now):
+
+        # run the whole Newton iteration on device: one fori_loop instead of a
+        # Python loop dispatching loss/gradient/Hessian separately per step
+        def gn_body(iter_step, carry):
+            sol, loss_hist = carry
+            if linear_solver == "cg":
+                sol = sol - step_size * self.GN_step_cg(sol)
+            else:
+                grad_now, hess_now = self.GN_step(sol)
+                sol = sol - step_size * jnp.linalg.solve(hess_now, grad_now)
+            return sol, loss_hist.at[iter_step].set(self.loss(sol))
+
+        loss_hist = jnp.zeros(max_iter + 1).at[0].set(self.loss(sol))
+        sol, loss_hist = lax.fori_loop(
+            1, max_iter + 1, gn_body, (jnp.asarray(sol), loss_hist)
+        )
+        if jnp.isnan(loss_hist).any():
             print("[Error] Loss is nan: maybe nugget is too small!")
             # sys.exit()
         if print_hist:
-            print("iter = 0", "Loss =", loss_now)  # print out history
-
-        for iter_step in range(1, max_iter + 1):
-            temp = jnp.linalg.solve(self.Hessian_GN(sol, sol), self.grad_loss(sol))
-            sol = sol - step_size * temp
-            loss_now = self.loss(sol)
-            if jnp.isnan(loss_now):
-                print("[Error] Loss is nan: maybe nugget is too small!")
-                # sys.exit()
-            loss_hist.append(loss_now)
-            if print_hist:
-                # print out history
+            # print out history
+            print("iter = 0", "Loss =", loss_hist[0])
+            for iter_step in range(1, max_iter + 1):
                 print(
                     "iter = ",
                     iter_step,
                     "Gauss-Newton step size =",
                     step_size,
                     " Loss = ",
-                    loss_now,
+                    loss_hist[iter_step],
                 )
         self.max_iter = max_iter
         self.step_size = step_size
         self.loss_hist = loss_hist
 
-        sol_vec = jnp.append(self.alpha * (sol**self.m) - self.rhs_f, sol)
-        sol_vec = jnp.append(sol_vec, self.bdy_g)
+        sol_vec = jnp.concatenate(
+            (self.alpha * (sol**self.m) - self.rhs_f, sol, self.bdy_g)
+        )
         self.sol_vec = sol_vec
         self.sol_sampled_pts = sol
 
     @partial(jit, static_argnums=(0,))
-    def loss_relaxed(self, z, pen_lambda):
+    def _loss_relaxed(self, fac, z, pen_lambda):
         v = z[: self.N_domain]
         w = z[self.N_domain :]
-        temp = jnp.append(v, w)
-        temp = jnp.append(temp, self.bdy_g)
-        ss = jnp.linalg.solve(self.L, temp)
+        temp = jnp.concatenate((v, w, jnp.zeros(self.N_boundary)))
+        ss = fac.L_inv_bdy + solve_triangular(fac.L, temp, lower=True)
 
-        ss2 = -v + self.alpha * (w ** (self.m)) - self.rhs_f
+        ss2 = -v + self.alpha * (w ** (self.m)) - fac.rhs_f
 
         return jnp.dot(ss, ss) + jnp.dot(ss2, ss2) / pen_lambda
 
+    def loss_relaxed(self, z, pen_lambda):
+        return self._loss_relaxed(self.factors, z, pen_lambda)
+
     @partial(jit, static_argnums=(0,))
+    def _grad_loss_relaxed(self, fac, z, pen_lambda):
+        return grad(self._loss_relaxed, argnums=1)(fac, z, pen_lambda)
+
     def grad_loss_relaxed(self, z, pen_lambda):
-        return grad(self.loss_relaxed)(z, pen_lambda)
+        return self._grad_loss_relaxed(self.factors, z, pen_lambda)
 
     @partial(jit, static_argnums=(0,))
     # linearized loss function: used for GN method
-    def GN_loss_relaxed(self, z, z_old, pen_lambda):
+    def _GN_loss_relaxed(self, fac, z, z_old, pen_lambda):
         v = z[: self.N_domain]
         w = z[self.N_domain :]
         w_old = z_old[self.N_domain :]
-        temp = jnp.append(v, w)
-        temp = jnp.append(temp, self.bdy_g)
-        ss = jnp.linalg.solve(self.L, temp)
+        temp = jnp.concatenate((v, w, jnp.zeros(self.N_boundary)))
+        ss = fac.L_inv_bdy + solve_triangular(fac.L, temp, lower=True)
 
         ss2 = (
             -v
             + self.alpha * self.m * (w_old ** (self.m - 1)) * (w - w_old)
-            - self.rhs_f
+            - fac.rhs_f
         )
 
         return jnp.dot(ss, ss) + jnp.dot(ss2, ss2) / pen_lambda
 
+    def GN_loss_relaxed(self, z, z_old, pen_lambda):
+        return self._GN_loss_relaxed(self.factors, z, z_old, pen_lambda)
+
     @partial(jit, static_argnums=(0,))
+    def _Hessian_GN_relaxed(self, fac, z, z_old, pen_lambda):
+        return hessian(self._GN_loss_relaxed, argnums=1)(fac, z, z_old, pen_lambda)
+
     def Hessian_GN_relaxed(self, z, z_old, pen_lambda):
-        return hessian(self.GN_loss_relaxed)(z, z_old, pen_lambda)
+        return self._Hessian_GN_relaxed(self.factors, z, z_old, pen_lambda)
 
     def GN_relaxed_method(
         self,
@@ -213,49 +452,77 @@ class Nonlinear_elliptic2d(object):
         initial_sol="rdm",
         pen_lambda=1e-10,
         print_hist=True,
+        key=None,
     ):
         print(f"Relaxed approach: penalization parameter = {pen_lambda}")
+        # draw the initial guess with jax.random so it is born on device and
+        # reproducible across backends
+        if key is None:
+            key = jrandom.PRNGKey(0)
         if initial_sol == "rdm":
-            sol = random.normal(0.0, 1.0, (2 * self.N_domain))
+            sol = jrandom.normal(key, (2 * self.N_domain,))
         self.init_sol = sol
-        loss_hist = []  # history of loss function values
-        loss_now = self.loss_relaxed(sol, pen_lambda)
-        loss_hist.append(loss_now)
-        if jnp.isnan(loss_now):
-            print("[Error] Loss is nan: maybe nugget is too small!")
-            # sys.exit()
-        if print_hist:
-            print("iter = 0", "Loss =", loss_now)  # print out history
 
-        for iter_step in range(1, max_iter + 1):
+        # keep the loss history in a preallocated device array and defer the
+        # nan check and printing until after the loop, avoiding a host sync
+        # per iteration
+        def gn_body(iter_step, carry):
+            sol, loss_hist = carry
             temp = jnp.linalg.solve(
                 self.Hessian_GN_relaxed(sol, sol, pen_lambda),
                 self.grad_loss_relaxed(sol, pen_lambda),
             )
             sol = sol - step_size * temp
-            loss_now = self.loss_relaxed(sol, pen_lambda)
-            if jnp.isnan(loss_now):
-                print("[Error] Loss is nan: maybe nugget is too small!")
-                # sys.exit()
-            loss_hist.append(loss_now)
-            if print_hist:
-                # print out history
+            return sol, loss_hist.at[iter_step].set(self.loss_relaxed(sol, pen_lambda))
+
+        loss_hist = (
+            jnp.zeros(max_iter + 1).at[0].set(self.loss_relaxed(sol, pen_lambda))
+        )
+        sol, loss_hist = lax.fori_loop(
+            1, max_iter + 1, gn_body, (jnp.asarray(sol), loss_hist)
+        )
+        if jnp.isnan(loss_hist).any():
+            print("[Error] Loss is nan: maybe nugget is too small!")
+            # sys.exit()
+        if print_hist:
+            # print out history
+            print("iter = 0", "Loss =", loss_hist[0])
+            for iter_step in range(1, max_iter + 1):
                 print(
                     "iter = ",
                     iter_step,
                     "Gauss-Newton step size =",
                     step_size,
                     " Loss = ",
-                    loss_now,
+                    loss_hist[iter_step],
                 )
         self.max_iter = max_iter
         self.step_size = step_size
         self.loss_hist = loss_hist
-        sol_vec = jnp.append(sol, self.bdy_g)
+        sol_vec = jnp.concatenate((sol, self.bdy_g))
         self.sol_vec = sol_vec
         self.sol_sampled_pts = sol[self.N_domain :]
 
-    def extend_sol(self, X_test):
+    def _prepare_weights(self):
+        # cache w = Theta^{-1} sol_vec so repeated test-set evaluations only
+        # pay for the Theta_test @ w product; rerun after solving again
+        if self.L.dtype == jnp.float32:
+            self.w = solve_refine(self.L, self.Theta, self.sol_vec)
+        else:
+            # bdy_g is fixed after Gram_Cholesky, so only the z-dependent
+            # prefix of sol_vec needs a fresh solve
+            self.w = self._w_bdy + cho_solve(
+                self.L_factor,
+                jnp.concatenate(
+                    (
+                        self.sol_vec[: 2 * self.N_domain],
+                        jnp.zeros(self.N_boundary),
+                    )
+                ),
+            )
+
+    def predict(self, X_test):
+        # extension to one query set; assumes _prepare_weights has been called
         Theta_test = construct_Theta_test(
             X_test,
             self.X_domain,
@@ -264,12 +531,20 @@ class Nonlinear_elliptic2d(object):
             kernel=self.kernel,
             kernel_parameter=self.kernel_parameter,
         )
-        temp = jnp.linalg.solve(
-            jnp.transpose(self.L), jnp.linalg.solve(self.L, self.sol_vec)
-        )
+        return jnp.matmul(Theta_test, self.w)
+
+    def predict_batch(self, X_tests):
+        # stack query grids along a leading axis into one GEMM instead of a
+        # separate matmul per grid
+        n_batch, n_pts, dim = X_tests.shape
+        vals = self.predict(X_tests.reshape(n_batch * n_pts, dim))
+        return vals.reshape(n_batch, n_pts)
+
+    def extend_sol(self, X_test):
+        self._prepare_weights()
         self.X_test = X_test
         self.N_test = X_test.shape[0]
-        self.extended_sol = jnp.matmul(Theta_test, temp)
+        self.extended_sol = self.predict(X_test)
 
 
 class Burgers(object):
@@ -283,14 +558,22 @@ class Burgers(object):
         self.rhs = rhs
         self.domain = domain
 
-    @partial(jit, static_argnums=(0,))
+    # not jitted: with self static, every new instance would retrace and
+    # recompile, and these are evaluated once per sampling anyway
     def get_bd(self, x1, x2):
         return self.bdy(x1, x2)
 
-    @partial(jit, static_argnums=(0,))
     def get_rhs(self, x1, x2):
         return self.rhs(x1, x2)
 
+    # row-wise variants, so vmap over sampled points reads whole rows instead
+    # of gathering the two coordinate columns separately
+    def get_bd_vec(self, x):
+        return self.bdy(x[0], x[1])
+
+    def get_rhs_vec(self, x):
+        return self.rhs(x[0], x[1])
+
     def sampled_pts(self, N_domain, N_boundary, sampled_type="random"):
         # if rdm is true, sample points uniformly randomly, else in a uniform grid
         if sampled_type == "random":
@@ -305,8 +588,9 @@ class Burgers(object):
         self.N_domain = X_domain.shape[0]
         self.X_boundary = X_boundary
         self.N_boundary = X_boundary.shape[0]
-        self.rhs_f = vmap(self.get_rhs)(X_domain[:, 0], X_domain[:, 1])
-        self.bdy_g = vmap(self.get_bd)(X_boundary[:, 0], X_boundary[:, 1])
+        self.rhs_f = vmap(self.get_rhs_vec)(X_domain)
+        self.bdy_g = vmap(self.get_bd_vec)(X_boundary)
+        self._Theta_raw = None  # points changed: invalidate the cached Gram matrix
 
     # directly given sampled points
     def get_sampled_points(self, X_domain, X_boundary):
@@ -314,8 +598,26 @@ class Burgers(object):
         self.N_domain = X_domain.shape[0]
         self.X_boundary = X_boundary
         self.N_boundary = X_boundary.shape[0]
-        self.rhs_f = vmap(self.get_rhs)(X_domain[:, 0], X_domain[:, 1])
-        self.bdy_g = vmap(self.get_bd)(X_boundary[:, 0], X_boundary[:, 1])
+        self.rhs_f = vmap(self.get_rhs_vec)(X_domain)
+        self.bdy_g = vmap(self.get_bd_vec)(X_boundary)
+        self._Theta_raw = None  # points changed: invalidate the cached Gram matrix
+
+    # cache the raw (nugget-free) Gram matrix so sweeping nugget or
+    # nugget_type does not redo the dominant assembly work
+    def _assemble_raw(self, kernel, kernel_parameter):
+        if (
+            getattr(self, "_Theta_raw", None) is None
+            or self._Theta_raw_key != (kernel, kernel_parameter)
+        ):
+            self._Theta_raw = Gram_matrix_assembly(
+                self.X_domain,
+                self.X_boundary,
+                eqn="Burgers",
+                kernel=kernel,
+                kernel_parameter=kernel_parameter,
+            )
+            self._Theta_raw_key = (kernel, kernel_parameter)
+        return self._Theta_raw
 
     def Gram_matrix(
         self,
@@ -324,131 +626,220 @@ class Burgers(object):
         nugget=1e-5,
         nugget_type="adaptive",
     ):
-        Theta = Gram_matrix_assembly(
-            self.X_domain,
-            self.X_boundary,
-            eqn="Burgers",
-            kernel=kernel,
-            kernel_parameter=kernel_parameter,
-        )
+        Theta = self._assemble_raw(kernel, kernel_parameter)
         self.nugget_type = nugget_type
         self.nugget = nugget
         self.kernel = kernel
         self.kernel_parameter = kernel_parameter
         if nugget_type == "adaptive":
-            # calculate trace
-            trace1 = jnp.trace(Theta[: self.N_domain, : self.N_domain])
-            trace2 = jnp.trace(
-                Theta[
-                    self.N_domain : 2 * self.N_domain, self.N_domain : 2 * self.N_domain
-                ]
+            self.Theta, ratios = _add_adaptive_nugget(
+                Theta, self.N_domain, self.N_boundary, 3, nugget
             )
-            trace3 = jnp.trace(
-                Theta[
-                    2 * self.N_domain : 3 * self.N_domain,
-                    2 * self.N_domain : 3 * self.N_domain,
-                ]
-            )
-            trace4 = jnp.trace(Theta[3 * self.N_domain :, 3 * self.N_domain :])
-            ratio = [trace1 / trace4, trace2 / trace4, trace3 / trace4]
-            self.ratio = ratio
-            temp = jnp.concatenate(
-                (
-                    ratio[0] * jnp.ones((1, self.N_domain)),
-                    ratio[1] * jnp.ones((1, self.N_domain)),
-                    ratio[2] * jnp.ones((1, self.N_domain)),
-                    jnp.ones((1, self.N_domain + self.N_boundary)),
-                ),
-                axis=1,
-            )
-            self.Theta = Theta + nugget * jnp.diag(temp[0])
+            self.ratio = ratios
         elif nugget_type == "identity":
-            self.Theta = Theta + nugget * jnp.eye(4 * self.N_domain + self.N_boundary)
+            # add along the diagonal directly instead of forming nugget*I
+            idx = jnp.arange(4 * self.N_domain + self.N_boundary)
+            self.Theta = Theta.at[idx, idx].add(nugget)
         elif nugget_type == "none":
             self.Theta = Theta
 
-    def Gram_Cholesky(self):
-        try:
-            self.L = jnp.linalg.cholesky(self.Theta)
-        except:
+    def Gram_Cholesky(self, precision="double"):
+        # precision="single" factors in float32; extend_sol then recovers
+        # double accuracy through iterative refinement (solve_refine).
+        # Re-factorizing an already-factored object at another precision is
+        # fine: the snapshot below carries the new factor into the jitted
+        # closures
+        Theta = self.Theta
+        if precision == "single":
+            Theta = Theta.astype(jnp.float32)
+        # keep the packed factor for cho_solve; self.L aliases the lower
+        # triangle for the one-sided solves in the loss closures
+        self.L_factor = cho_factor(Theta, lower=True)
+        self.L = self.L_factor[0]
+        # jax reports a non-SPD matrix through NaNs in the factor rather than
+        # by raising, so check explicitly to fail before the Newton loop
+        if jnp.isnan(self.L).any():
             print("[Error] Cholesky factorization failed: maybe nugget is too small!")
             sys.exit()
+        # solve the z-independent residual blocks against L once, so the loss
+        # closure only re-solves the z-dependent part each iteration
+        self.L_inv_const = solve_triangular(
+            self.L,
+            jnp.concatenate(
+                (self.rhs_f, jnp.zeros(3 * self.N_domain), self.bdy_g)
+            ),
+            lower=True,
+        )
+        # full solve of the boundary block, reused by every extend_sol call
+        self._w_bdy = cho_solve(
+            self.L_factor,
+            jnp.concatenate((jnp.zeros(4 * self.N_domain), self.bdy_g)),
+        )
+        # pre-solve the four interior row blocks of the identity against L;
+        # the GN Jacobian's column blocks are diagonal scalings of these, so
+        # L^{-1} J becomes broadcasted column scalings (_solved_jacobian)
+        # with no triangular solve left per Newton iteration
+        idx = jnp.arange(4 * self.N_domain)
+        E = jnp.zeros((4 * self.N_domain + self.N_boundary, 4 * self.N_domain))
+        E = E.at[idx, idx].set(1.0)
+        B = solve_triangular(self.L, E, lower=True)
+        self._B = [B[:, k * self.N_domain : (k + 1) * self.N_domain] for k in range(4)]
+        # snapshot of this factorization for the jitted closures, which take
+        # it as a traced argument rather than reading mutable state off self
+        self.factors = _BurgersFactors(self.L, self.L_inv_const, self._B)
 
     @partial(jit, static_argnums=(0,))
-    def loss(self, z):
+    def _loss(self, fac, z):
         v0 = z[: self.N_domain]
         v2 = z[self.N_domain : 2 * self.N_domain]
         v3 = z[2 * self.N_domain :]
 
-        vv = jnp.append(self.nu * v3 + self.rhs_f - self.alpha * v0 * v2, v2)
-        vv = jnp.append(vv, v3)
-        vv = jnp.append(vv, v0)
-        vv = jnp.append(vv, self.bdy_g)
-        temp = jnp.linalg.solve(self.L, vv)
+        vv = jnp.concatenate(
+            (
+                self.nu * v3 - self.alpha * v0 * v2,
+                v2,
+                v3,
+                v0,
+                jnp.zeros(self.N_boundary),
+            )
+        )
+        temp = fac.L_inv_const + solve_triangular(fac.L, vv, lower=True)
         return jnp.dot(temp, temp)
 
+    def loss(self, z):
+        return self._loss(self.factors, z)
+
     @partial(jit, static_argnums=(0,))
+    def _grad_loss(self, fac, z):
+        return grad(self._loss, argnums=1)(fac, z)
+
     def grad_loss(self, z):
-        return grad(self.loss)(z)
+        return self._grad_loss(self.factors, z)
 
-    @partial(jit, static_argnums=(0,))
-    def Hessian_GN(self, z):
+    def _solved_jacobian(self, fac, z):
+        # L^{-1} J assembled from the pre-solved basis: each column block of
+        # the Jacobian with respect to z = (v0, v2, v3) is a diagonal scaling
+        # of fixed row blocks, so the triangular solve reduces to broadcasted
+        # column scalings of the cached B blocks
         v0 = z[: self.N_domain]
         v2 = z[self.N_domain : 2 * self.N_domain]
-
-        mtx = jnp.zeros((4 * self.N_domain + self.N_boundary, 3 * self.N_domain))
-        mtx1 = jnp.concatenate(
+        B0, B1, B2, B3 = fac.B
+        return jnp.concatenate(
             (
-                -self.alpha * jnp.diag(v2),
-                -self.alpha * jnp.diag(v0),
-                self.nu * jnp.eye(self.N_domain),
+                -self.alpha * v2[None, :] * B0 + B3,
+                -self.alpha * v0[None, :] * B0 + B1,
+                self.nu * B0 + B2,
             ),
             axis=1,
         )
-        mtx = mtx.at[0 : self.N_domain, :].set(mtx1)
-        mtx = mtx.at[
-            self.N_domain : 2 * self.N_domain, self.N_domain : 2 * self.N_domain
-        ].set(jnp.eye(self.N_domain))
-        mtx = mtx.at[
-            2 * self.N_domain : 3 * self.N_domain, 2 * self.N_domain : 3 * self.N_domain
-        ].set(jnp.eye(self.N_domain))
-        mtx = mtx.at[3 * self.N_domain : 4 * self.N_domain, : self.N_domain].set(
-            jnp.eye(self.N_domain)
-        )
-        ss = jnp.linalg.solve(self.L, mtx)
+
+    @partial(jit, static_argnums=(0,))
+    def _Hessian_GN(self, fac, z):
+        ss = self._solved_jacobian(fac, z)
         return 2 * jnp.matmul(jnp.transpose(ss), ss)
 
-    def GN_method(self, max_iter=10, step_size=1, initial_sol="rdm", print_hist=True):
+    def Hessian_GN(self, z):
+        return self._Hessian_GN(self.factors, z)
+
+    def _gn_factors(self, fac, z):
+        # residual and Jacobian solved against L, shared by the step variants
+        v0 = z[: self.N_domain]
+        v2 = z[self.N_domain : 2 * self.N_domain]
+        v3 = z[2 * self.N_domain :]
+
+        vv = jnp.concatenate(
+            (
+                self.nu * v3 - self.alpha * v0 * v2,
+                v2,
+                v3,
+                v0,
+                jnp.zeros(self.N_boundary),
+            )
+        )
+        r = fac.L_inv_const + solve_triangular(fac.L, vv, lower=True)
+        Jt = self._solved_jacobian(fac, z)
+        return r, Jt
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_step(self, fac, z):
+        # fused Gauss-Newton step: the gradient 2 J^T L^{-T} r and the Hessian
+        # 2 J^T L^{-T} L^{-1} J share the same solved Jacobian L^{-1} J
+        r, Jt = self._gn_factors(fac, z)
+        return 2 * jnp.matmul(jnp.transpose(Jt), r), 2 * jnp.matmul(
+            jnp.transpose(Jt), Jt
+        )
+
+    def GN_step(self, z):
+        return self._GN_step(self.factors, z)
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_step_cg(self, fac, z):
+        # matrix-free variant: solve H d = grad by conjugate gradients on
+        # v -> 2 Jt^T (Jt v) without ever forming the Hessian
+        r, Jt = self._gn_factors(fac, z)
+        grad_now = 2 * jnp.matmul(jnp.transpose(Jt), r)
+        # Jacobi preconditioner: the Hessian diagonal is the squared column
+        # norms of Jt, and without it cg stalls within the iteration budget
+        # on the ill-conditioned systems small nuggets produce
+        diag_H = 2 * jnp.sum(Jt * Jt, axis=0)
+        step, _ = cg(
+            lambda v: 2 * jnp.matmul(jnp.transpose(Jt), jnp.matmul(Jt, v)),
+            grad_now,
+            tol=1e-8,
+            maxiter=50,
+            M=lambda v: v / diag_H,
+        )
+        return step
+
+    def GN_step_cg(self, z):
+        return self._GN_step_cg(self.factors, z)
+
+    def GN_method(
+        self,
+        max_iter=10,
+        step_size=1,
+        initial_sol="rdm",
+        print_hist=True,
+        linear_solver="direct",
+        key=None,
+    ):
+        # draw the initial guess with jax.random so it is born on device and
+        # reproducible across backends
+        if key is None:
+            key = jrandom.PRNGKey(0)
         if initial_sol == "rdm":
-            sol = random.normal(0.0, 1.0, (3 * self.N_domain))
+            sol = jrandom.normal(key, (3 * self.N_domain,))
         self.init_sol = sol
-        loss_hist = []  # history of loss function values
-        loss_now = self.loss(sol)
-        if jnp.isnan(loss_now):
+
+        # run the whole Newton iteration on device: one fori_loop instead of a
+        # Python loop dispatching loss/gradient/Hessian separately per step
+        def gn_body(iter_step, carry):
+            sol, loss_hist = carry
+            if linear_solver == "cg":
+                sol = sol - step_size * self.GN_step_cg(sol)
+            else:
+                grad_now, hess_now = self.GN_step(sol)
+                sol = sol - step_size * jnp.linalg.solve(hess_now, grad_now)
+            return sol, loss_hist.at[iter_step].set(self.loss(sol))
+
+        loss_hist = jnp.zeros(max_iter + 1).at[0].set(self.loss(sol))
+        sol, loss_hist = lax.fori_loop(
+            1, max_iter + 1, gn_body, (jnp.asarray(sol), loss_hist)
+        )
+        if jnp.isnan(loss_hist).any():
             print("[Error] Loss is nan: maybe nugget is too small!")
             # sys.exit()
-        loss_hist.append(loss_now)
-
         if print_hist:
-            print("iter = 0", "Loss =", loss_now)  # print out history
-
-        for iter_step in range(1, max_iter + 1):
-            temp = jnp.linalg.solve(self.Hessian_GN(sol), self.grad_loss(sol))
-            sol = sol - step_size * temp
-            loss_now = self.loss(sol)
-            if jnp.isnan(loss_now):
-                print("[Error] Loss is nan: maybe nugget is too small!")
-                # sys.exit()
-            loss_hist.append(loss_now)
-            if print_hist:
-                # print out history
+            # print out history
+            print("iter = 0", "Loss =", loss_hist[0])
+            for iter_step in range(1, max_iter + 1):
                 print(
                     "iter = ",
                     iter_step,
                     "Gauss-Newton step size =",
                     step_size,
                     " Loss = ",
-                    loss_now,
+                    loss_hist[iter_step],
                 )
         self.max_iter = max_iter
         self.step_size = step_size
@@ -464,7 +855,26 @@ class Burgers(object):
         self.sol_vec = sol_vec
         self.sol_sampled_pts = v0
 
-    def extend_sol(self, X_test):
+    def _prepare_weights(self):
+        # cache w = Theta^{-1} sol_vec so repeated test-set evaluations only
+        # pay for the Theta_test @ w product; rerun after solving again
+        if self.L.dtype == jnp.float32:
+            self.w = solve_refine(self.L, self.Theta, self.sol_vec)
+        else:
+            # bdy_g is fixed after Gram_Cholesky, so only the z-dependent
+            # prefix of sol_vec needs a fresh solve
+            self.w = self._w_bdy + cho_solve(
+                self.L_factor,
+                jnp.concatenate(
+                    (
+                        self.sol_vec[: 4 * self.N_domain],
+                        jnp.zeros(self.N_boundary),
+                    )
+                ),
+            )
+
+    def predict(self, X_test):
+        # extension to one query set; assumes _prepare_weights has been called
         Theta_test = construct_Theta_test(
             X_test,
             self.X_domain,
@@ -473,30 +883,48 @@ class Burgers(object):
             kernel=self.kernel,
             kernel_parameter=self.kernel_parameter,
         )
-        temp = jnp.linalg.solve(
-            jnp.transpose(self.L), jnp.linalg.solve(self.L, self.sol_vec)
-        )
+        return jnp.matmul(Theta_test, self.w)
+
+    def predict_batch(self, X_tests):
+        # stack query grids along a leading axis into one GEMM instead of a
+        # separate matmul per grid
+        n_batch, n_pts, dim = X_tests.shape
+        vals = self.predict(X_tests.reshape(n_batch * n_pts, dim))
+        return vals.reshape(n_batch, n_pts)
+
+    def extend_sol(self, X_test):
+        self._prepare_weights()
         self.X_test = X_test
         self.N_test = X_test.shape[0]
-        self.extended_sol = jnp.matmul(Theta_test, temp)
+        self.extended_sol = self.predict(X_test)
 
 
 class Eikonal(object):
     def __init__(self, eps=3, bdy=None, rhs=None, domain=onp.array([[0, 1], [0, 1]])):
         # default -|\nabla u|^2 = f + eps* \Delta u
         self.eps = eps
+        # reciprocal, so per-element scalings multiply instead of divide
+        self._inv_eps = 1.0 / eps
         self.bdy = bdy
         self.rhs = rhs
         self.domain = domain
 
-    @partial(jit, static_argnums=(0,))
+    # not jitted: with self static, every new instance would retrace and
+    # recompile, and these are evaluated once per sampling anyway
     def get_bd(self, x1, x2):
         return self.bdy(x1, x2)
 
-    @partial(jit, static_argnums=(0,))
     def get_rhs(self, x1, x2):
         return self.rhs(x1, x2)
 
+    # row-wise variants, so vmap over sampled points reads whole rows instead
+    # of gathering the two coordinate columns separately
+    def get_bd_vec(self, x):
+        return self.bdy(x[0], x[1])
+
+    def get_rhs_vec(self, x):
+        return self.rhs(x[0], x[1])
+
     # sampling points according to random or grid rules
     def sampled_pts(self, N_domain, N_boundary, sampled_type="random"):
         # if rdm is true, sample points uniformly randomly, else in a uniform grid
@@ -512,8 +940,9 @@ class Eikonal(object):
         self.N_domain = X_domain.shape[0]
         self.X_boundary = X_boundary
         self.N_boundary = X_boundary.shape[0]
-        self.rhs_f = vmap(self.get_rhs)(X_domain[:, 0], X_domain[:, 1])
-        self.bdy_g = vmap(self.get_bd)(X_boundary[:, 0], X_boundary[:, 1])
+        self.rhs_f = vmap(self.get_rhs_vec)(X_domain)
+        self.bdy_g = vmap(self.get_bd_vec)(X_boundary)
+        self._Theta_raw = None  # points changed: invalidate the cached Gram matrix
 
     # directly given sampled points
     def get_sampled_points(self, X_domain, X_boundary):
@@ -521,8 +950,31 @@ class Eikonal(object):
         self.N_domain = X_domain.shape[0]
         self.X_boundary = X_boundary
         self.N_boundary = X_boundary.shape[0]
-        self.rhs_f = vmap(self.get_rhs)(X_domain[:, 0], X_domain[:, 1])
-        self.bdy_g = vmap(self.get_bd)(X_boundary[:, 0], X_boundary[:, 1])
+        self.rhs_f = vmap(self.get_rhs_vec)(X_domain)
+        self.bdy_g = vmap(self.get_bd_vec)(X_boundary)
+        self._Theta_raw = None  # points changed: invalidate the cached Gram matrix
+
+    # cache the raw (nugget-free) Gram matrix so sweeping nugget or
+    # nugget_type does not redo the dominant assembly work
+    def _assemble_raw(self, kernel, kernel_parameter):
+        if (
+            getattr(self, "_Theta_raw", None) is None
+            or self._Theta_raw_key != (kernel, kernel_parameter)
+        ):
+            # this assembly fills a host numpy buffer; convert once here so
+            # the diagonal updates in Gram_matrix can use .at[] on a device
+            # array
+            self._Theta_raw = jnp.asarray(
+                Gram_matrix_assembly(
+                    self.X_domain,
+                    self.X_boundary,
+                    eqn="Eikonal",
+                    kernel=kernel,
+                    kernel_parameter=kernel_parameter,
+                )
+            )
+            self._Theta_raw_key = (kernel, kernel_parameter)
+        return self._Theta_raw
 
     def Gram_matrix(
         self,
@@ -531,125 +983,255 @@ class Eikonal(object):
         nugget=1e-8,
         nugget_type="adaptive",
     ):
-        Theta = Gram_matrix_assembly(
-            self.X_domain,
-            self.X_boundary,
-            eqn="Eikonal",
-            kernel=kernel,
-            kernel_parameter=kernel_parameter,
-        )
+        Theta = self._assemble_raw(kernel, kernel_parameter)
         self.nugget_type = nugget_type
         self.nugget = nugget
         self.kernel = kernel
         self.kernel_parameter = kernel_parameter
         if nugget_type == "adaptive":
-            # calculate trace
-            trace1 = onp.trace(Theta[: self.N_domain, : self.N_domain])
-            trace2 = onp.trace(
-                Theta[
-                    self.N_domain : 2 * self.N_domain, self.N_domain : 2 * self.N_domain
-                ]
+            # the onp.trace calls here pulled each diagonal block off the
+            # device; the shared helper keeps the whole update on device
+            self.Theta, ratios = _add_adaptive_nugget(
+                Theta, self.N_domain, self.N_boundary, 3, nugget
             )
-            trace3 = onp.trace(
-                Theta[
-                    2 * self.N_domain : 3 * self.N_domain,
-                    2 * self.N_domain : 3 * self.N_domain,
-                ]
-            )
-            trace4 = onp.trace(Theta[3 * self.N_domain :, 3 * self.N_domain :])
-            ratio = [trace1 / trace4, trace2 / trace4, trace3 / trace4]
-            temp = onp.concatenate(
-                (
-                    ratio[0] * jnp.ones((1, self.N_domain)),
-                    ratio[1] * jnp.ones((1, self.N_domain)),
-                    ratio[2] * jnp.ones((1, self.N_domain)),
-                    jnp.ones((1, self.N_domain + self.N_boundary)),
-                ),
-                axis=1,
-            )
-            self.Theta = Theta + nugget * jnp.diag(temp[0])
+            self.ratio = ratios
         elif nugget_type == "identity":
-            self.Theta = Theta + nugget * jnp.eye(4 * self.N_domain + self.N_boundary)
+            # add along the diagonal directly instead of forming nugget*I
+            idx = jnp.arange(4 * self.N_domain + self.N_boundary)
+            self.Theta = Theta.at[idx, idx].add(nugget)
         elif nugget_type == "none":
             self.Theta = Theta
 
-    def Gram_Cholesky(self):
-        try:
-            self.L = jnp.linalg.cholesky(self.Theta)
-        except:
+    def Gram_Cholesky(self, precision="double"):
+        # precision="single" factors in float32; extend_sol then recovers
+        # double accuracy through iterative refinement (solve_refine).
+        # Re-factorizing an already-factored object at another precision is
+        # fine: the snapshot below carries the new factor into the jitted
+        # closures
+        Theta = self.Theta
+        if precision == "single":
+            Theta = Theta.astype(jnp.float32)
+        # keep the packed factor for cho_solve; self.L aliases the lower
+        # triangle for the one-sided solves in the loss closures
+        self.L_factor = cho_factor(Theta, lower=True)
+        self.L = self.L_factor[0]
+        # jax reports a non-SPD matrix through NaNs in the factor rather than
+        # by raising, so check explicitly to fail before the Newton loop
+        if jnp.isnan(self.L).any():
             print("[Error] Cholesky factorization failed: maybe nugget is too small!")
             sys.exit()
+        # solve the z-independent residual blocks against L once, so the loss
+        # closures only re-solve the z-dependent part each iteration
+        self.L_inv_const = solve_triangular(
+            self.L,
+            jnp.concatenate(
+                (
+                    jnp.zeros(2 * self.N_domain),
+                    -self.rhs_f**2 * self._inv_eps,
+                    jnp.zeros(self.N_domain),
+                    self.bdy_g,
+                )
+            ),
+            lower=True,
+        )
+        # full solve of the boundary block, reused by every extend_sol call
+        self._w_bdy = cho_solve(
+            self.L_factor,
+            jnp.concatenate((jnp.zeros(4 * self.N_domain), self.bdy_g)),
+        )
+        # snapshot of this factorization for the jitted closures, which take
+        # it as a traced argument rather than reading mutable state off self
+        self.factors = _EikonalFactors(self.L, self.L_inv_const)
 
     @partial(jit, static_argnums=(0,))
-    def loss(self, z):
+    def _loss(self, fac, z):
         v0 = z[: self.N_domain]
         v1 = z[self.N_domain : 2 * self.N_domain]
         v2 = z[2 * self.N_domain :]
-        v3 = -(self.rhs_f**2 - v1**2 - v2**2) / self.eps
 
-        vv = jnp.append(v1, v2)
-        vv = jnp.append(vv, v3)
-        vv = jnp.append(vv, v0)
-        vv = jnp.append(vv, self.bdy_g)
-        zz = jnp.linalg.solve(self.L, vv)
+        vv = jnp.concatenate(
+            (v1, v2, (v1**2 + v2**2) * self._inv_eps, v0, jnp.zeros(self.N_boundary))
+        )
+        zz = fac.L_inv_const + solve_triangular(fac.L, vv, lower=True)
         return jnp.dot(zz, zz)
 
+    def loss(self, z):
+        return self._loss(self.factors, z)
+
     @partial(jit, static_argnums=(0,))
+    def _grad_loss(self, fac, z):
+        return grad(self._loss, argnums=1)(fac, z)
+
     def grad_loss(self, z):
-        return grad(self.loss)(z)
+        return self._grad_loss(self.factors, z)
 
+    # z-dependent part of the linearized residual, shared by GN_loss and Hessian_GN
     @partial(jit, static_argnums=(0,))
-    def GN_loss(self, z, z_old):
+    def _residual_gn(self, z, z_old):
         v1_old = z_old[self.N_domain : 2 * self.N_domain]
         v2_old = z_old[2 * self.N_domain :]
 
         v0 = z[: self.N_domain]
         v1 = z[self.N_domain : 2 * self.N_domain]
         v2 = z[2 * self.N_domain :]
-        v3 = -(self.rhs_f**2 - 2 * v1 * v1_old - 2 * v2 * v2_old) / self.eps
 
-        vv = jnp.append(v1, v2)
-        vv = jnp.append(vv, v3)
-        vv = jnp.append(vv, v0)
-        vv = jnp.append(vv, self.bdy_g)
-        zz = jnp.linalg.solve(self.L, vv)
+        return jnp.concatenate(
+            (
+                v1,
+                v2,
+                2 * (v1 * v1_old + v2 * v2_old) * self._inv_eps,
+                v0,
+                jnp.zeros(self.N_boundary),
+            )
+        )
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_loss(self, fac, z, z_old):
+        zz = fac.L_inv_const + solve_triangular(
+            fac.L, self._residual_gn(z, z_old), lower=True
+        )
         return jnp.dot(zz, zz)
 
+    def GN_loss(self, z, z_old):
+        return self._GN_loss(self.factors, z, z_old)
+
     @partial(jit, static_argnums=(0,))
+    def _Hessian_GN(self, fac, z, z_old):
+        # GN_loss is quadratic in z, so its Hessian is 2 J^T (L L^T)^{-1} J with
+        # J the residual Jacobian; jacfwd of the affine residual avoids
+        # differentiating through the triangular solve twice
+        dR = jacfwd(self._residual_gn)(z, z_old)
+        J = solve_triangular(fac.L, dR, lower=True)
+        return 2 * jnp.matmul(jnp.transpose(J), J)
+
     def Hessian_GN(self, z, z_old):
-        return hessian(self.GN_loss)(z, z_old)
+        return self._Hessian_GN(self.factors, z, z_old)
+
+    def _jacobian_gn(self, z_old):
+        # Jacobian of the stacked residual with respect to z; also the Jacobian
+        # of the linearized residual used by GN_loss
+        v1_old = z_old[self.N_domain : 2 * self.N_domain]
+        v2_old = z_old[2 * self.N_domain :]
+
+        # scatter only the O(N) nonzero entries instead of materializing
+        # dense jnp.diag/jnp.eye blocks
+        idx = jnp.arange(self.N_domain)
+        mtx = jnp.zeros((4 * self.N_domain + self.N_boundary, 3 * self.N_domain))
+        mtx = mtx.at[idx, self.N_domain + idx].set(1.0)
+        mtx = mtx.at[self.N_domain + idx, 2 * self.N_domain + idx].set(1.0)
+        mtx = mtx.at[2 * self.N_domain + idx, self.N_domain + idx].set(
+            2 * v1_old * self._inv_eps
+        )
+        mtx = mtx.at[2 * self.N_domain + idx, 2 * self.N_domain + idx].set(
+            2 * v2_old * self._inv_eps
+        )
+        mtx = mtx.at[3 * self.N_domain + idx, idx].set(1.0)
+        return mtx
+
+    @partial(jit, static_argnums=(0,))
+    def _Hessian_GN_explicit(self, fac, z_old):
+        # closed-form Gauss-Newton Hessian 2 J^T (L L^T)^{-1} J, where J is the
+        # Jacobian of the linearized residual; avoids differentiating through
+        # the linear solve twice
+        ss = solve_triangular(fac.L, self._jacobian_gn(z_old), lower=True)
+        return 2 * jnp.matmul(jnp.transpose(ss), ss)
+
+    def Hessian_GN_explicit(self, z_old):
+        return self._Hessian_GN_explicit(self.factors, z_old)
+
+    def _gn_factors(self, fac, z):
+        # residual and Jacobian solved against L, shared by the step variants
+        v0 = z[: self.N_domain]
+        v1 = z[self.N_domain : 2 * self.N_domain]
+        v2 = z[2 * self.N_domain :]
+
+        vv = jnp.concatenate(
+            (v1, v2, (v1**2 + v2**2) * self._inv_eps, v0, jnp.zeros(self.N_boundary))
+        )
+        r = fac.L_inv_const + solve_triangular(fac.L, vv, lower=True)
+        Jt = solve_triangular(fac.L, self._jacobian_gn(z), lower=True)
+        return r, Jt
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_step(self, fac, z):
+        # fused Gauss-Newton step: the gradient 2 J^T L^{-T} r and the Hessian
+        # 2 J^T L^{-T} L^{-1} J share the same solved Jacobian L^{-1} J
+        r, Jt = self._gn_factors(fac, z)
+        return 2 * jnp.matmul(jnp.transpose(Jt), r), 2 * jnp.matmul(
+            jnp.transpose(Jt), Jt
+        )
+
+    def GN_step(self, z):
+        return self._GN_step(self.factors, z)
+
+    @partial(jit, static_argnums=(0,))
+    def _GN_step_cg(self, fac, z):
+        # matrix-free variant: solve H d = grad by conjugate gradients on
+        # v -> 2 Jt^T (Jt v) without ever forming the Hessian
+        r, Jt = self._gn_factors(fac, z)
+        grad_now = 2 * jnp.matmul(jnp.transpose(Jt), r)
+        # Jacobi preconditioner: the Hessian diagonal is the squared column
+        # norms of Jt, and without it cg stalls within the iteration budget
+        # on the ill-conditioned systems small nuggets produce
+        diag_H = 2 * jnp.sum(Jt * Jt, axis=0)
+        step, _ = cg(
+            lambda v: 2 * jnp.matmul(jnp.transpose(Jt), jnp.matmul(Jt, v)),
+            grad_now,
+            tol=1e-8,
+            maxiter=50,
+            M=lambda v: v / diag_H,
+        )
+        return step
+
+    def GN_step_cg(self, z):
+        return self._GN_step_cg(self.factors, z)
 
-    def GN_method(self, max_iter=3, step_size=1, initial_sol="rdm", print_hist=True):
+    def GN_method(
+        self,
+        max_iter=3,
+        step_size=1,
+        initial_sol="rdm",
+        print_hist=True,
+        linear_solver="direct",
+        key=None,
+    ):
+        # draw the initial guess with jax.random so it is born on device and
+        # reproducible across backends
+        if key is None:
+            key = jrandom.PRNGKey(0)
         if initial_sol == "rdm":
-            sol = random.normal(0.0, 1.0, (3 * self.N_domain))
+            sol = jrandom.normal(key, (3 * self.N_domain,))
         self.init_sol = sol
-        loss_hist = []  # history of loss function values
-        loss_now = self.loss(sol)
-        if jnp.isnan(loss_now):
+
+        # run the whole Newton iteration on device: one fori_loop instead of a
+        # Python loop dispatching loss/gradient/Hessian separately per step
+        def gn_body(iter_step, carry):
+            sol, loss_hist = carry
+            if linear_solver == "cg":
+                sol = sol - step_size * self.GN_step_cg(sol)
+            else:
+                grad_now, hess_now = self.GN_step(sol)
+                sol = sol - step_size * jnp.linalg.solve(hess_now, grad_now)
+            return sol, loss_hist.at[iter_step].set(self.loss(sol))
+
+        loss_hist = jnp.zeros(max_iter + 1).at[0].set(self.loss(sol))
+        sol, loss_hist = lax.fori_loop(
+            1, max_iter + 1, gn_body, (jnp.asarray(sol), loss_hist)
+        )
+        if jnp.isnan(loss_hist).any():
             print("[Error] Loss is nan: maybe nugget is too small!")
             # sys.exit()
-        loss_hist.append(loss_now)
-
         if print_hist:
-            print("iter = 0", "Loss =", loss_now)  # print out history
-
-        for iter_step in range(1, max_iter + 1):
-            temp = jnp.linalg.solve(self.Hessian_GN(sol, sol), self.grad_loss(sol))
-            sol = sol - step_size * temp
-            loss_now = self.loss(sol)
-            if jnp.isnan(loss_now):
-                print("[Error] Loss is nan: maybe nugget is too small!")
-                # sys.exit()
-            loss_hist.append(loss_now)
-            if print_hist:
-                # print out history
+            # print out history
+            print("iter = 0", "Loss =", loss_hist[0])
+            for iter_step in range(1, max_iter + 1):
                 print(
                     "iter = ",
                     iter_step,
                     "Gauss-Newton step size =",
                     step_size,
                     " Loss = ",
-                    loss_now,
+                    loss_hist[iter_step],
                 )
         self.max_iter = max_iter
         self.step_size = step_size
@@ -658,16 +1240,32 @@ class Eikonal(object):
         v0 = sol[: self.N_domain]
         v1 = sol[self.N_domain : 2 * self.N_domain]
         v2 = sol[2 * self.N_domain :]
-        v3 = -(self.rhs_f**2 - v1**2 - v2**2) / self.eps
-        vv = jnp.append(v1, v2)
-        vv = jnp.append(vv, v3)
-        vv = jnp.append(vv, v0)
-        sol_vec = jnp.append(vv, self.bdy_g)
+        v3 = -(self.rhs_f**2 - v1**2 - v2**2) * self._inv_eps
+        sol_vec = jnp.concatenate((v1, v2, v3, v0, self.bdy_g))
 
         self.sol_vec = sol_vec
         self.sol_sampled_pts = v0
 
-    def extend_sol(self, X_test):
+    def _prepare_weights(self):
+        # cache w = Theta^{-1} sol_vec so repeated test-set evaluations only
+        # pay for the Theta_test @ w product; rerun after solving again
+        if self.L.dtype == jnp.float32:
+            self.w = solve_refine(self.L, self.Theta, self.sol_vec)
+        else:
+            # bdy_g is fixed after Gram_Cholesky, so only the z-dependent
+            # prefix of sol_vec needs a fresh solve
+            self.w = self._w_bdy + cho_solve(
+                self.L_factor,
+                jnp.concatenate(
+                    (
+                        self.sol_vec[: 4 * self.N_domain],
+                        jnp.zeros(self.N_boundary),
+                    )
+                ),
+            )
+
+    def predict(self, X_test):
+        # extension to one query set; assumes _prepare_weights has been called
         Theta_test = construct_Theta_test(
             X_test,
             self.X_domain,
@@ -676,9 +1274,17 @@ class Eikonal(object):
             kernel=self.kernel,
             kernel_parameter=self.kernel_parameter,
         )
-        temp = jnp.linalg.solve(
-            jnp.transpose(self.L), jnp.linalg.solve(self.L, self.sol_vec)
-        )
+        return jnp.matmul(Theta_test, self.w)
+
+    def predict_batch(self, X_tests):
+        # stack query grids along a leading axis into one GEMM instead of a
+        # separate matmul per grid
+        n_batch, n_pts, dim = X_tests.shape
+        vals = self.predict(X_tests.reshape(n_batch * n_pts, dim))
+        return vals.reshape(n_batch, n_pts)
+
+    def extend_sol(self, X_test):
+        self._prepare_weights()
         self.X_test = X_test
         self.N_test = X_test.shape[0]
-        self.extended_sol = jnp.matmul(Theta_test, temp)
+        self.extended_sol = self.predict(X_test)
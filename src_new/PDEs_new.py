@@ -3,8 +3,10 @@ from functools import partial
 
 import jax.numpy as jnp
 import jax.ops as jop
-from jax import grad, hessian, jit, vmap
+import jax.random as jrandom
+from jax import grad, hessian, jit, lax, vmap
 from jax.config import config
+from jax.scipy.linalg import cho_solve, solve_triangular
 
 config.update("jax_enable_x64", True)
 
@@ -12,9 +14,9 @@ import sys
 
 # numpy
 import numpy as onp
-from numpy import random
 
 # from src.Gram_matrice import Gram_matrix_assembly, construct_Theta_test
+from src.PDEs import _add_adaptive_nugget
 from src.sample_points import sampled_pts_grid, sampled_pts_rdm
 from .Gram_matrice_new import Gram_matrix_assembly, construct_Theta_test
 
@@ -30,11 +32,11 @@ class Burgers(object):
         self.rhs = rhs
         self.domain = domain
 
-    @partial(jit, static_argnums=(0,))
+    # not jitted: with self static, every new instance would retrace and
+    # recompile, and these are evaluated once per sampling anyway
     def get_bd(self, x1, x2):
         return self.bdy(x1, x2)
 
-    @partial(jit, static_argnums=(0,))
     def get_rhs(self, x1, x2):
         return self.rhs(x1, x2)
 
@@ -71,6 +73,10 @@ class Burgers(object):
         nugget=1e-5,
         nugget_type="adaptive",
     ):
+        # the assembly treats kernel_parameter as a static (hashable) jit
+        # argument, so lists become tuples here
+        if isinstance(kernel_parameter, list):
+            kernel_parameter = tuple(kernel_parameter)
         Theta = Gram_matrix_assembly(
             self.X_domain,
             self.X_boundary,
@@ -78,51 +84,79 @@ class Burgers(object):
             kernel=kernel,
             kernel_parameter=kernel_parameter,
         )
+        # the assembly runs in float32; upcast once here so the nugget and
+        # the Cholesky work in full precision
+        Theta = Theta.astype(jnp.float64)
         self.nugget_type = nugget_type
         self.nugget = nugget
         self.kernel = kernel
         self.kernel_parameter = kernel_parameter
         if nugget_type == "adaptive":
-            # calculate trace
-            trace1 = jnp.trace(Theta[: self.N_domain, : self.N_domain])
-            trace2 = jnp.trace(
-                Theta[
-                    self.N_domain : 2 * self.N_domain, self.N_domain : 2 * self.N_domain
-                ]
+            # one jitted pass: block traces, weights and diagonal update fuse,
+            # with no dense jnp.diag materialization (shared with src.PDEs).
+            # trace_start keeps the original normalization, which divides the
+            # block traces by the trace of the boundary corner alone
+            self.Theta, ratios = _add_adaptive_nugget(
+                Theta, self.N_domain, self.N_boundary, 2, nugget, 3 * self.N_domain
             )
-            trace4 = jnp.trace(Theta[3 * self.N_domain :, 3 * self.N_domain :])
-            ratio = [trace1 / trace4, trace2 / trace4]
-            self.ratio = ratio
-            temp = jnp.concatenate(
-                (
-                    ratio[0] * jnp.ones((1, self.N_domain)),
-                    ratio[1] * jnp.ones((1, self.N_domain)),
-                    jnp.ones((1, self.N_domain + self.N_boundary)),
-                ),
-                axis=1,
-            )
-            self.Theta = Theta + nugget * jnp.diag(temp[0])
+            self.ratio = ratios
         elif nugget_type == "identity":
-            self.Theta = Theta + nugget * jnp.eye(3 * self.N_domain + self.N_boundary)
+            # add along the diagonal directly instead of forming nugget*I
+            idx = jnp.arange(3 * self.N_domain + self.N_boundary)
+            self.Theta = Theta.at[idx, idx].add(nugget)
         elif nugget_type == "none":
             self.Theta = Theta
 
     def Gram_Cholesky(self):
         try:
-            self.L = jnp.linalg.cholesky(self.Theta)
+            # blocked Cholesky: factor the 2N x 2N derivative block, push it
+            # through the cross block and factor the Schur complement of the
+            # kernel block. The assembled L is identical to
+            # jnp.linalg.cholesky(self.Theta), but the one big factorization
+            # becomes two smaller ones plus level-3 updates.
+            n2 = 2 * self.N_domain
+            L_A = jnp.linalg.cholesky(self.Theta[:n2, :n2])
+            W = solve_triangular(L_A, self.Theta[:n2, n2:], lower=True)
+            L_S = jnp.linalg.cholesky(
+                self.Theta[n2:, n2:] - jnp.matmul(jnp.transpose(W), W)
+            )
+            self.L = jnp.block(
+                [
+                    [L_A, jnp.zeros_like(W)],
+                    [jnp.transpose(W), L_S],
+                ]
+            )
         except:
             print("[Error] Cholesky factorization failed: maybe nugget is too small!")
             sys.exit()
+        # pre-solve the three interior row blocks of the identity against L
+        # once. G[a][b] is then the (a, b) interior sub-block of Theta^{-1},
+        # and Hessian_GN reduces to diagonal scalings of these fixed blocks
+        # with no triangular solve left inside the Newton loop.
+        idx = jnp.arange(3 * self.N_domain)
+        E = jnp.zeros((3 * self.N_domain + self.N_boundary, 3 * self.N_domain))
+        E = E.at[idx, idx].set(1.0)
+        B = solve_triangular(self.L, E, lower=True)
+        G = jnp.matmul(jnp.transpose(B), B)
+        self._G = [
+            [
+                G[
+                    a * self.N_domain : (a + 1) * self.N_domain,
+                    b * self.N_domain : (b + 1) * self.N_domain,
+                ]
+                for b in range(3)
+            ]
+            for a in range(3)
+        ]
 
     @partial(jit, static_argnums=(0,))
     def loss(self, z):
         v0 = z[: self.N_domain]
         v2 = z[self.N_domain : 2 * self.N_domain]
 
-        vv = jnp.append(self.rhs_f - self.alpha * v0 * v2, v2)
-        vv = jnp.append(vv, v0)
-        vv = jnp.append(vv, self.bdy_g)
-        temp = jnp.linalg.solve(self.L, vv)
+        vv = jnp.concatenate((self.rhs_f - self.alpha * v0 * v2, v2, v0, self.bdy_g))
+        # self.L is triangular, so back-substitution beats the LU solve
+        temp = solve_triangular(self.L, vv, lower=True)
         return jnp.dot(temp, temp)
 
     @partial(jit, static_argnums=(0,))
@@ -134,55 +168,85 @@ class Burgers(object):
         v0 = z[: self.N_domain]
         v2 = z[self.N_domain : 2 * self.N_domain]
 
-        mtx = jnp.zeros((3 * self.N_domain + self.N_boundary, 2 * self.N_domain))
-        mtx1 = jnp.concatenate(
-            (
-                -self.alpha * jnp.diag(v2),
-                -self.alpha * jnp.diag(v0),
-            ),
-            axis=1,
+        # the v0 column block of J is -alpha*diag(v2) in rows 0:N plus an
+        # identity in rows 2N:3N, and the v2 block is -alpha*diag(v0) in rows
+        # 0:N plus an identity in rows N:2N. With the precomputed Theta^{-1}
+        # sub-blocks G[a][b], J^T Theta^{-1} J is therefore a diagonal-scaled
+        # combination of fixed matrices: no solve per iteration.
+        G = self._G
+        d0 = -self.alpha * v2
+        d1 = -self.alpha * v0
+        H00 = (
+            d0[:, None] * G[0][0] * d0[None, :]
+            + d0[:, None] * G[0][2]
+            + G[2][0] * d0[None, :]
+            + G[2][2]
+        )
+        H01 = (
+            d0[:, None] * G[0][0] * d1[None, :]
+            + d0[:, None] * G[0][1]
+            + G[2][0] * d1[None, :]
+            + G[2][1]
         )
-        mtx = mtx.at[0 : self.N_domain, :].set(mtx1)
-        mtx = mtx.at[
-            self.N_domain : 2 * self.N_domain, self.N_domain : 2 * self.N_domain
-        ].set(jnp.eye(self.N_domain))
-        mtx = mtx.at[2 * self.N_domain : 3 * self.N_domain, : self.N_domain].set(
-            jnp.eye(self.N_domain)
+        H11 = (
+            d1[:, None] * G[0][0] * d1[None, :]
+            + d1[:, None] * G[0][1]
+            + G[1][0] * d1[None, :]
+            + G[1][1]
         )
-        ss = jnp.linalg.solve(self.L, mtx)
-        return 2 * jnp.matmul(jnp.transpose(ss), ss)
+        return 2 * jnp.block([[H00, H01], [jnp.transpose(H01), H11]])
+
+    @partial(jit, static_argnums=(0,), donate_argnums=(2,))
+    def _gn_iterations(self, sol, loss_hist, step_size):
+        # run the whole Newton iteration on device: one fori_loop instead of
+        # a Python loop paying a dispatch and host sync per iteration.
+        # loss_hist is donated so XLA reuses its buffer across iterations
+        # instead of allocating a fresh one; sol is not, because the caller
+        # keeps the incoming array alive as self.init_sol and donation would
+        # delete it. The iteration count comes from the history buffer's
+        # (static) length and step_size is traced, so sweeping either does
+        # not retrace.
+        def gn_body(iter_step, carry):
+            sol, loss_hist = carry
+            # the Gauss-Newton Hessian is symmetric positive semi-definite,
+            # so a Cholesky solve (with a tiny jitter against exact
+            # rank-deficiency) replaces the general LU solve at half the
+            # factorization cost
+            H = self.Hessian_GN(sol)
+            idx = jnp.arange(H.shape[0])
+            L_H = jnp.linalg.cholesky(H.at[idx, idx].add(1e-10))
+            sol = sol - step_size * cho_solve((L_H, True), self.grad_loss(sol))
+            return sol, loss_hist.at[iter_step].set(self.loss(sol))
+
+        return lax.fori_loop(1, loss_hist.shape[0], gn_body, (sol, loss_hist))
 
-    def GN_method(self, max_iter=10, step_size=1, initial_sol="rdm", print_hist=True):
+    def GN_method(
+        self, max_iter=10, step_size=1, initial_sol="rdm", print_hist=True, key=None
+    ):
         if initial_sol == "rdm":
-            sol = random.normal(0.0, 1.0, (2 * self.N_domain))
+            # draw the initial guess on device with a reproducible key instead
+            # of pulling it from numpy's global generator and transferring it
+            if key is None:
+                key = jrandom.PRNGKey(0)
+            sol = jrandom.normal(key, (2 * self.N_domain,))
         self.init_sol = sol
-        loss_hist = []  # history of loss function values
-        loss_now = self.loss(sol)
-        if jnp.isnan(loss_now):
+
+        loss_hist = jnp.zeros(max_iter + 1).at[0].set(self.loss(sol))
+        sol, loss_hist = self._gn_iterations(sol, loss_hist, step_size)
+        if jnp.isnan(loss_hist).any():
             print("[Error] Loss is nan: maybe nugget is too small!")
             # sys.exit()
-        loss_hist.append(loss_now)
-
         if print_hist:
-            print("iter = 0", "Loss =", loss_now)  # print out history
-
-        for iter_step in range(1, max_iter + 1):
-            temp = jnp.linalg.solve(self.Hessian_GN(sol), self.grad_loss(sol))
-            sol = sol - step_size * temp
-            loss_now = self.loss(sol)
-            if jnp.isnan(loss_now):
-                print("[Error] Loss is nan: maybe nugget is too small!")
-                # sys.exit()
-            loss_hist.append(loss_now)
-            if print_hist:
-                # print out history
+            # print out history
+            print("iter = 0", "Loss =", loss_hist[0])
+            for iter_step in range(1, max_iter + 1):
                 print(
                     "iter = ",
                     iter_step,
                     "Gauss-Newton step size =",
                     step_size,
                     " Loss = ",
-                    loss_now,
+                    loss_hist[iter_step],
                 )
         self.max_iter = max_iter
         self.step_size = step_size
@@ -197,18 +261,33 @@ class Burgers(object):
         self.sol_vec = sol_vec
         self.sol_sampled_pts = v0
 
-    def extend_sol(self, X_test):
-        Theta_test = construct_Theta_test(
-            X_test,
-            self.X_domain,
-            self.X_boundary,
-            eqn="Burgers",
-            kernel=self.kernel,
-            kernel_parameter=self.kernel_parameter,
-        )
-        temp = jnp.linalg.solve(
-            jnp.transpose(self.L), jnp.linalg.solve(self.L, self.sol_vec)
+    def extend_sol(self, X_test, chunk_size=256):
+        # evaluate the test kernel rows chunk by chunk and contract each
+        # chunk with the weights immediately, so at most chunk_size rows of
+        # the (N_test, 3N + Nb) test Gram are alive at a time instead of the
+        # whole matrix
+        temp = solve_triangular(
+            self.L,
+            solve_triangular(self.L, self.sol_vec, lower=True),
+            lower=True,
+            trans="T",
         )
+        N_test = X_test.shape[0]
+        n_chunks = -(-N_test // chunk_size)
+        X_pad = jnp.zeros((n_chunks * chunk_size, 2)).at[:N_test].set(X_test)
+
+        def chunk_vals(X_chunk):
+            Theta_chunk = construct_Theta_test(
+                X_chunk,
+                self.X_domain,
+                self.X_boundary,
+                eqn="Burgers",
+                kernel=self.kernel,
+                kernel_parameter=self.kernel_parameter,
+            )
+            return jnp.matmul(Theta_chunk, temp)
+
+        vals = lax.map(chunk_vals, X_pad.reshape(n_chunks, chunk_size, 2))
         self.X_test = X_test
-        self.N_test = X_test.shape[0]
-        self.extended_sol = jnp.matmul(Theta_test, temp)
+        self.N_test = N_test
+        self.extended_sol = vals.reshape(-1)[:N_test]